@@ -1,23 +1,40 @@
+import functools
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from dateutil import parser
-import pytz 
-
-def get_api_response(app_id, api_endpoint, params):
-    """Makes the API request and returns the JSON response."""
-    response = requests.get(api_endpoint, params=params)
+import xlsxwriter
+from xlsxwriter.utility import xl_range
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# Shared session so repeat calls reuse pooled keep-alive connections to eBay
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Timezone for listing end times
+# Change to any timezone
+CST = ZoneInfo('US/Central')
+
+class EbayAPIError(RuntimeError):
+    """Raised when the eBay API request fails or returns an error response."""
+
+def get_api_response(app_id, api_endpoint, params, page=1):
+    """Makes the API request for one results page and returns the JSON response."""
+    params = {**params, 'paginationInput.pageNumber': str(page)}
+    response = SESSION.get(api_endpoint, params=params, timeout=(3.05, 30))
     print("Status Code:", response.status_code)  # Debugging statement
 
     if response.status_code != 200:
-        print(f"HTTP Error: {response.status_code}")
-        exit()
+        raise EbayAPIError(f"HTTP Error: {response.status_code}")
 
     try:
-        data = response.json()
+        data = orjson.loads(response.content)
     except ValueError as e:
-        print("Error parsing JSON response:", e)
-        exit()
+        raise EbayAPIError(f"Error parsing JSON response: {e}") from e
 
     return data
 
@@ -27,83 +44,65 @@ def parse_items(data):
         response_data = data['findItemsAdvancedResponse'][0]
         if 'errorMessage' in response_data:
             errors = response_data['errorMessage'][0]['error']
-            for error in errors:
-                print(f"Error Code: {error['errorId'][0]}, Message: {error['message'][0]}")
-            exit()
+            raise EbayAPIError('\n'.join(f"Error Code: {error['errorId'][0]}, Message: {error['message'][0]}"
+                                         for error in errors))
         else:
             items = response_data['searchResult'][0].get('item', [])
             items = items[:50]  # Limit to 50 items - limit is not hard set 
-            if not items:
-                print("No items found matching your criteria.")
-                exit()
             return items
     else:
-        print("Unexpected response format.")
-        exit()
+        raise EbayAPIError("Unexpected response format.")
+
+# Shared read-only defaults for missing fields (never mutated, so safe to reuse)
+_EMPTY_L = ({},)
+_NA_L = ('N/A',)
+_NONE_L = (None,)
+
+# Output columns, in the order process_item returns them
+COLUMNS = ['Title', 'Price', 'Currency', '_shipping_raw', 'Listing Type',
+           'Item Condition', '_end_raw', 'URL']
 
 def process_item(item):
-    """Processes an individual item and returns a dictionary of extracted data."""
-    title = item.get('title', ['N/A'])[0]
-    url = item.get('viewItemURL', ['N/A'])[0]
+    """Processes an individual item and returns a row tuple in COLUMNS order."""
+    title = item.get('title', _NA_L)[0]
+    url = item.get('viewItemURL', _NA_L)[0]
     # Extract price
-    price_info = item.get('sellingStatus', [{}])[0].get('currentPrice', [{}])[0]
+    price_info = item.get('sellingStatus', _EMPTY_L)[0].get('currentPrice', _EMPTY_L)[0]
     price = price_info.get('__value__', 'N/A')
     currency = price_info.get('@currencyId', 'N/A')
-    # Extract shipping price
-    shipping_info = item.get('shippingInfo', [{}])[0]
-    shipping_cost_info = shipping_info.get('shippingServiceCost', [{}])[0]
-    shipping_price = shipping_cost_info.get('__value__', 'N/A')
-    if shipping_price in ['0.0', '0.00', '0']:
-        shipping_price = 'FREE'
-    elif shipping_price != 'N/A':
-        shipping_price = f"{float(shipping_price):.2f}"
+    # Extract raw shipping price (formatted for all items at once in main)
+    shipping_info = item.get('shippingInfo', _EMPTY_L)[0]
+    shipping_cost_info = shipping_info.get('shippingServiceCost', _EMPTY_L)[0]
+    shipping_price = shipping_cost_info.get('__value__')
     # Extract listing type
-    listing_type = item.get('listingInfo', [{}])[0].get('listingType', ['N/A'])[0]
+    listing_type = item.get('listingInfo', _EMPTY_L)[0].get('listingType', _NA_L)[0]
     # Extract item condition
-    condition = item.get('condition', [{}])[0].get('conditionDisplayName', ['N/A'])[0]
-    # Extract end time
-    end_time_str = item.get('listingInfo', [{}])[0].get('endTime', [''])[0]
-    if end_time_str:
-        # Parse the end time string to a datetime object in UTC
-        end_time_utc = parser.parse(end_time_str)
-        # Convert to CST timezone
-        # Change to any timezone
-        cst = pytz.timezone('US/Central')
-        end_time_cst = end_time_utc.astimezone(cst)
-        # Format the datetime as a string in 12-hour format with AM/PM
-        end_time_formatted = end_time_cst.strftime('%Y-%m-%d %I:%M:%S %p')
-    else:
-        end_time_formatted = 'N/A'
+    condition = item.get('condition', _EMPTY_L)[0].get('conditionDisplayName', _NA_L)[0]
+    # Extract raw end time (parsed for all items at once in main)
+    end_time_str = item.get('listingInfo', _EMPTY_L)[0].get('endTime', _NONE_L)[0]
     # Return the processed item data
-    return {
-        'Title': title,
-        'Price': price,
-        'Currency': currency,
-        'Shipping Price': shipping_price,
-        'Listing Type': listing_type,
-        'Item Condition': condition,
-        'End Time': end_time_formatted,
-        'URL': url
-    }
-
-def save_to_excel(results, filename='ebay_listings.xlsx'):
-    """Saves the results to an Excel file with conditional formatting."""
-    import pandas as pd
+    return (title, price, currency, shipping_price, listing_type,
+            condition, end_time_str, url)
 
-    df = pd.DataFrame(results)
+def save_to_excel(df, filename='ebay_listings.xlsx'):
+    """Saves the DataFrame to an Excel file with conditional formatting."""
     if df.empty:
         print("No data to save to Excel.")
-        exit()
+        return
     else:
-        # Reorder columns as per your request
-        df = df[['Title', 'Price', 'Currency', 'Shipping Price', 'Listing Type',
-                 'Item Condition', 'End Time', 'URL']]
-
-        # Use ExcelWriter with xlsxwriter engine
-        with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
-            workbook = writer.book
-            worksheet = writer.sheets['Sheet1']
+        # Write with xlsxwriter directly; rows go out in order, so constant_memory
+        # can flush each one as it is written. Skip formula/URL detection on every string cell
+        with xlsxwriter.Workbook(filename, {'constant_memory': True,
+                                            'strings_to_formulas': False,
+                                            'strings_to_urls': False}) as workbook:
+            worksheet = workbook.add_worksheet('Sheet1')
+
+            # Stream the header and data rows straight into the worksheet
+            header_format = workbook.add_format({'bold': True, 'border': 1,
+                                                 'align': 'center', 'valign': 'top'})
+            worksheet.write_row(0, 0, df.columns, header_format)
+            for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+                worksheet.write_row(row_idx, 0, row)
 
             # Define formats
             green_format = workbook.add_format({'bg_color': '#C6EFCE',
@@ -114,45 +113,37 @@ def save_to_excel(results, filename='ebay_listings.xlsx'):
             # Get the dimensions of the dataframe
             max_row, max_col = df.shape
 
-            # Convert column index to Excel column letter
-            def colnum_string(n):
-                string = ''
-                while n >= 0:
-                    n, remainder = divmod(n, 26)
-                    string = chr(65 + remainder) + string
-                    n -= 1
-                return string
-
-            # Get the column letter for "Listing Type"
+            # Get the column index for "Listing Type"
             listing_type_col_idx = df.columns.get_loc('Listing Type')
-            listing_type_col_letter = colnum_string(listing_type_col_idx)
 
             # Define the cell range for conditional formatting
             start_row = 1  # Row 0 is the header
             end_row = max_row  # Number of data rows
-            cell_range = f'{listing_type_col_letter}{start_row + 1}:{listing_type_col_letter}{end_row + 1}'
-
-            # Apply green format to 'FixedPrice'
-            worksheet.conditional_format(cell_range, {'type': 'text',
-                                                      'criteria': 'containing',
-                                                      'value': 'FixedPrice',
-                                                      'format': green_format})
-
-            # Apply yellow format to 'Auction'
-            worksheet.conditional_format(cell_range, {'type': 'text',
-                                                      'criteria': 'containing',
-                                                      'value': 'Auction',
-                                                      'format': yellow_format})
-
-            # Adjust column widths
+            cell_range = xl_range(start_row, listing_type_col_idx, end_row, listing_type_col_idx)
+
+            # Green for 'FixedPrice', yellow for 'Auction' (incl. AuctionWithBIN).
+            # Both rules share one range, so xlsxwriter emits a single block;
+            # 'begins with' compiles to LEFT() instead of ISERROR(SEARCH()).
+            for value, cell_format in (('FixedPrice', green_format),
+                                       ('Auction', yellow_format)):
+                worksheet.conditional_format(cell_range, {'type': 'text',
+                                                          'criteria': 'begins with',
+                                                          'value': value,
+                                                          'format': cell_format})
+
+            # Adjust column widths from the longest value per column, in one pass
+            widths = df.astype(str).apply(lambda s: s.str.len().max()).to_dict()
             for idx, col in enumerate(df.columns):
-                # Get the maximum length of the data in the column
-                max_len = df[col].astype(str).map(len).max()
-                # Set the column width
-                worksheet.set_column(idx, idx, max_len + 5)
+                # Set the column width, never narrower than the header
+                worksheet.set_column(idx, idx, max(len(col), widths[col]) + 5)
 
             print(f"Data saved to {filename} with conditional formatting.")
 
+@functools.lru_cache(maxsize=1)
+def end_time_filter(minute):
+    """Returns the EndTimeTo filter value (minute + 24 hours) in ISO 8601 format."""
+    return (minute + timedelta(hours=24)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
 def main():
     # Your eBay App ID (Client ID)
     APP_ID = 'EBAY_APP_ID'  # Replace with your actual App ID
@@ -160,11 +151,15 @@ def main():
     # eBay Finding API endpoint
     API_ENDPOINT = 'https://svcs.ebay.com/services/search/FindingService/v1'
 
+    # Number of result pages to fetch (50 items per page)
+    PAGES = 1
+
     # Keyword to search for
     KEYWORD = 'Nintendo 64 Game Console'  # Replace with your desired keyword
 
-    # Calculate the end time (current time + 24 hours) in ISO 8601 format
-    end_time_to = (datetime.utcnow() + timedelta(hours=24)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    # Calculate the end time (current time + 24 hours), reused within the same minute
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    end_time_to = end_time_filter(now)
 
     # Set up parameters for the API request
     params = {
@@ -183,20 +178,40 @@ def main():
         'sortOrder': 'EndTimeSoonest',
     }
 
-    # Get API response
-    data = get_api_response(APP_ID, API_ENDPOINT, params)
-
-    # Parse items from response
-    items = parse_items(data)
-
-    # Process each item
+    # Fetch all pages concurrently over the shared session
+    fetch_page = functools.partial(get_api_response, APP_ID, API_ENDPOINT, params)
     results = []
-    for item in items:
-        processed_item = process_item(item)
-        results.append(processed_item)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            # Results come back in page order; each page is turned into rows
+            # as it is consumed
+            for data in executor.map(fetch_page, range(1, PAGES + 1)):
+                results.extend(map(process_item, parse_items(data)))
+    except EbayAPIError as e:
+        print(e)
+        sys.exit(1)
+
+    if not results:
+        print("No items found matching your criteria.")
+        return
+
+    # Build the DataFrame once from the row tuples
+    df = pd.DataFrame.from_records(results, columns=COLUMNS)
+
+    # Format shipping prices: FREE for zero, N/A when missing, else 2 decimals
+    shipping = pd.to_numeric(df['_shipping_raw'], errors='coerce')
+    df['_shipping_raw'] = np.where(shipping == 0, 'FREE',
+                                   np.where(shipping.isna(), 'N/A', shipping.map('{:.2f}'.format)))
+
+    # Parse all end times in one pass (UTC) and convert to CST
+    df['_end_raw'] = (pd.to_datetime(df['_end_raw'], utc=True, format='ISO8601', errors='coerce')
+                      .dt.tz_convert(CST)
+                      .dt.strftime('%Y-%m-%d %I:%M:%S %p')
+                      .fillna('N/A'))
+    df = df.rename(columns={'_shipping_raw': 'Shipping Price', '_end_raw': 'End Time'})
 
     # Save results to Excel
-    save_to_excel(results)
+    save_to_excel(df)
 
 if __name__ == '__main__':
     main()